@@ -2,31 +2,38 @@ import curses
 import random
 import time
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from enum import Enum
-from threading import Event, Lock, Thread
-from typing import Any, List, Tuple, Type, Union
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Tuple, Type, Union
 
 
 class Subscriber(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def event_received(self, event: object):
         pass
 
 
 class Drawable(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def draw(self, win):
         pass
 
 
 class Finalizer(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def finalize(self, message: str):
         pass
 
 
 class Actionable(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def action(self):
         pass
@@ -36,32 +43,32 @@ class GameOver(Exception):
     pass
 
 
-class Direction(Enum):
-    LEFT = curses.KEY_LEFT
-    RIGHT = curses.KEY_RIGHT
-    UP = curses.KEY_UP
-    DOWN = curses.KEY_DOWN
+# directions are plain ints, the key codes of arrow keys the snake is controlled with
+DIR_LEFT = curses.KEY_LEFT
+DIR_RIGHT = curses.KEY_RIGHT
+DIR_UP = curses.KEY_UP
+DIR_DOWN = curses.KEY_DOWN
 
 
-@dataclass
-class SnakeElement(Drawable):
-    y: int
-    x: int
-
-    def draw(self, win):
-        win.addstr(self.y, self.x, 'X', curses.A_BOLD)
-
-
-@dataclass
+@dataclass(slots=True)
 class Mouse(Drawable):
     y: int
     x: int
+    # window is not cleared between frames, so the mouse is drawn again only after it moved
+    drawn: bool = field(default=False, compare=False)
 
     def draw(self, win):
-        win.addstr(self.y, self.x, 'M', curses.A_BOLD)
+        if not self.drawn:
+            win.addstr(self.y, self.x, 'M', curses.A_BOLD)
+            self.drawn = True
 
-    def intersect(self, head: SnakeElement) -> bool:
-        return self.x == head.x and self.y == head.y
+    def move(self, y: int, x: int):
+        self.y = y
+        self.x = x
+        self.drawn = False
+
+    def intersect(self, head: Tuple[int, int]) -> bool:
+        return self.y == head[0] and self.x == head[1]
 
 
 class Info(Drawable, Finalizer):
@@ -71,21 +78,38 @@ class Info(Drawable, Finalizer):
         self.top_x = top_x
         self.height = height
         self.width = width
-        self.score = 0
         self.game_over_message = ''
+        # window is not cleared between frames, so static parts are drawn once
+        # and the score only when it changes
+        self.border_drawn = False
+        self.score = 0
+
+    @property
+    def score(self) -> int:
+        return self._score
+
+    @score.setter
+    def score(self, score: int):
+        # score text is formatted here, as the score changes much less often than it is drawn
+        self._score = score
+        self.score_text = f'Score: {score}'
+        self.score_changed = True
 
     def draw(self, win):
-        # lower border
-        for x in range(self.width):
-            win.addstr(self.top_y + self.height - 1, x, '#', curses.A_BOLD)
+        if not self.border_drawn:
+            border_char = ord('#') | curses.A_BOLD
+            # lower border
+            win.hline(self.top_y + self.height - 1, 0, border_char, self.width)
 
-        # left and right border
-        for y in range(self.height):
-            win.addstr(self.top_y + y, 0, '#', curses.A_BOLD)
-            win.addstr(self.top_y + y, self.width - 1, '#', curses.A_BOLD)
+            # left and right border
+            win.vline(self.top_y, 0, border_char, self.height)
+            win.vline(self.top_y, self.width - 1, border_char, self.height)
+            self.border_drawn = True
 
         if not self.game_over_message:
-            win.addstr(self.top_y + 1, 2, f'Score: {self.score}', curses.A_BOLD)
+            if self.score_changed:
+                win.addstr(self.top_y + 1, 2, self.score_text, curses.A_BOLD)
+                self.score_changed = False
         else:
             win.addstr(self.top_y, 2, f'You {self.game_over_message} :(', curses.A_BOLD)
             win.addstr(self.top_y + 1, 2, f'Result: {self.score}', curses.A_BOLD)
@@ -95,21 +119,46 @@ class Info(Drawable, Finalizer):
         self.game_over_message = message
 
 
+# Collisions and occupancy are checked against a dense grid on purpose, not a spatial hash:
+# the field is small and bounded, so one bytearray read per check is as cheap as it gets,
+# with nothing to hash or rebuild. The snake, mouse and free cell bookkeeping around it
+# only ever touch the cells that change, so no per-tick operation depends on snake length.
 class GameField:
     def __init__(self, width: int, height: int):
-        self.cells = [[False for _ in range(width)] for _ in range(height)]
+        # flat row-major grid, cell (y, x) is at y * width + x, non-zero means occupied
+        self.cells = bytearray(width * height)
         self.width = width
         self.height = height
+        # cells where a mouse can be placed, kept up to date by occupy/release,
+        # so picking one doesn't require scanning the whole field.
+        # free_cell_index maps a cell to its position in free_cells for O(1) removal
+        self.free_cells = [(y, x) for y in range(1, self.height - 2) for x in range(1, self.width - 2)]
+        self.free_cell_index = {cell: idx for idx, cell in enumerate(self.free_cells)}
+
+    def occupy(self, y: int, x: int):
+        self.cells[y * self.width + x] = 1
+        free_cell_index = self.free_cell_index
+        idx = free_cell_index.pop((y, x), None)
+        if idx is not None:
+            # swap with the last free cell to remove without shifting the list
+            free_cells = self.free_cells
+            last_cell = free_cells.pop()
+            if idx < len(free_cells):
+                free_cells[idx] = last_cell
+                free_cell_index[last_cell] = idx
+
+    def release(self, y: int, x: int):
+        self.cells[y * self.width + x] = 0
+        free_cell_index = self.free_cell_index
+        if 1 <= y < self.height - 2 and 1 <= x < self.width - 2 and (y, x) not in free_cell_index:
+            free_cells = self.free_cells
+            free_cell_index[(y, x)] = len(free_cells)
+            free_cells.append((y, x))
 
     def get_free_cell(self) -> Tuple[int, int]:
-        free_cells = []
-        for y in range(1, self.height - 2):
-            for x in range(1, self.width - 2):
-                if not self.cells[y][x]:
-                    free_cells.append((y, x))
-        if not free_cells:
+        if not self.free_cells:
             raise GameOver('win')
-        return random.choice(free_cells)
+        return random.choice(self.free_cells)
 
 
 class Border(Drawable):
@@ -117,199 +166,230 @@ class Border(Drawable):
         self.game_field = game_field
         self.height = height
         self.width = width
-        for x in range(self.width):
-            self.game_field.cells[0][x] = True
-            self.game_field.cells[self.height - 1][x] = True
-        for y in range(self.height):
-            self.game_field.cells[y][0] = True
-            self.game_field.cells[y][self.width - 1] = True
+        self.drawn = False
+        # border is outside of the cells a mouse can be placed on,
+        # so its cells are marked occupied with slice assignments instead of occupy calls
+        cells = self.game_field.cells
+        stride = self.game_field.width
+        bottom = (self.height - 1) * stride
+        cells[0:self.width] = b'\x01' * self.width
+        cells[bottom:bottom + self.width] = b'\x01' * self.width
+        cells[0:bottom + 1:stride] = b'\x01' * self.height
+        cells[self.width - 1:bottom + self.width:stride] = b'\x01' * self.height
 
     def draw(self, win):
+        # border never changes and window is not cleared between frames
+        if self.drawn:
+            return
+        border_char = ord('#') | curses.A_BOLD
         # upper and lower border
-        for x in range(self.width):
-            win.addstr(0, x, '#', curses.A_BOLD)
-            win.addstr(self.height - 1, x, '#', curses.A_BOLD)
+        win.hline(0, 0, border_char, self.width)
+        win.hline(self.height - 1, 0, border_char, self.width)
 
         # left and right border
-        for y in range(self.height):
-            win.addstr(y, 0, '#', curses.A_BOLD)
-            win.addstr(y, self.width - 1, '#', curses.A_BOLD)
+        win.vline(0, 0, border_char, self.height)
+        win.vline(0, self.width - 1, border_char, self.height)
+        self.drawn = True
 
 
 class GameWorld:
-    def __init__(self, stdscr, win):
-        self.game_objects = []
-        self.stop = Event()
-        self.input_processor = InputProcessor(stdscr, [], self.stop)
-        self.input_processor.start()
-        self.stdscr = stdscr
+    # game loop period in seconds
+    TICK_DURATION = 0.3
+
+    def __init__(self, win):
         self.win = win
+        # game objects are sorted by role once when added, so the game loop doesn't check types
+        self.game_objects_by_type = {}
+        self.actionables = []
+        self.drawables = []
+        self.subscribers = []
         self.finalizers = []
 
     def add(self, game_object: Union[Actionable, Drawable, Subscriber]):
-        self.game_objects.append(game_object)
+        self.game_objects_by_type.setdefault(type(game_object), []).append(game_object)
+        if isinstance(game_object, Actionable):
+            self.actionables.append(game_object)
+        if isinstance(game_object, Drawable):
+            self.drawables.append(game_object)
         if isinstance(game_object, Subscriber):
-            self.input_processor.add_subscriber(game_object)
+            self.subscribers.append(game_object)
         if isinstance(game_object, Finalizer):
             self.finalizers.append(game_object)
 
     def run(self):
+        # ticks are scheduled at fixed points in time, so the time spent on a tick
+        # doesn't slow the game down
+        # attributes used on every tick are looked up once
+        monotonic = time.monotonic
+        tick_duration = self.TICK_DURATION
+        perform_actions = self._perform_actions
+        draw_objects = self._draw_objects
+        # window contents are only copied to the virtual screen with noutrefresh,
+        # doupdate then sends the difference to the terminal
+        noutrefresh = self.win.noutrefresh
+        doupdate = curses.doupdate
+        process_input = self._process_input
+        next_tick = monotonic() + tick_duration
         try:
             while True:
-                self.win.clear()
-                self._perform_actions()
-                self._draw_objects()
-                self.win.refresh()
-                time.sleep(0.3)
+                perform_actions()
+                draw_objects()
+                noutrefresh()
+                doupdate()
+                process_input(next_tick)
+                next_tick += tick_duration
+                now = monotonic()
+                if next_tick < now:
+                    # fell behind by more than a tick, don't try to catch up with a burst of ticks
+                    next_tick = now + tick_duration
         except GameOver as game_over:
             for finalizer in self.finalizers:
                 finalizer.finalize(str(game_over))
             self._draw_objects()
-            self.win.refresh()
-            self.stop.set()
-            self.input_processor.join()
+            self.win.noutrefresh()
+            curses.doupdate()
+            # wait for a key press to exit, ignoring keys pressed during the game
+            curses.flushinp()
+            self.win.timeout(-1)
+            self.win.getch()
 
     def get_game_object(self, game_object_type: Type) -> Union[Any, None]:
-        for game_object in self.game_objects:
-            if isinstance(game_object, game_object_type):
-                return game_object
+        game_objects = self.game_objects_by_type.get(game_object_type)
+        if game_objects:
+            return game_objects[0]
 
     def remove_game_object(self, game_object_type: Type):
-        self.game_objects = [
-            game_object for game_object in self.game_objects if not isinstance(game_object, game_object_type)
-        ]
+        removed_ids = {id(game_object) for game_object in self.game_objects_by_type.pop(game_object_type, [])}
+        for role_objects in (self.actionables, self.drawables, self.subscribers, self.finalizers):
+            role_objects[:] = [game_object for game_object in role_objects if id(game_object) not in removed_ids]
 
     def _perform_actions(self):
-        for game_object in self.game_objects:
-            if isinstance(game_object, Actionable):
-                game_object.action()
+        for game_object in self.actionables:
+            game_object.action()
 
     def _draw_objects(self):
-        for game_object in self.game_objects:
-            if isinstance(game_object, Drawable):
-                game_object.draw(self.win)
-
-
-class InputProcessor(Thread):
-    def __init__(self, stdscr, subscribers: List[Subscriber], stop_event: Event):
-        super().__init__(daemon=True, name='input_processor_thread')
-        self.stdscr = stdscr
-        self.subscribers = subscribers
-        self.stop_event = stop_event
-
-    def run(self):
-        while not self.stop_event.is_set():
-            new_char = self.stdscr.getch()
-            for subscriber in self.subscribers:
-                subscriber.event_received(new_char)
-
-    def add_subscriber(self, subscriber: Subscriber):
-        self.subscribers.append(subscriber)
+        win = self.win
+        for game_object in self.drawables:
+            game_object.draw(win)
+
+    def _process_input(self, deadline: float):
+        # input is read in the game loop thread, getch waits for a key at most until the deadline
+        monotonic = time.monotonic
+        set_timeout = self.win.timeout
+        getch = self.win.getch
+        subscribers = self.subscribers
+        while True:
+            timeout = deadline - monotonic()
+            if timeout <= 0:
+                break
+            set_timeout(max(1, int(timeout * 1000)))
+            new_char = getch()
+            if new_char != -1:
+                for subscriber in subscribers:
+                    subscriber.event_received(new_char)
 
 
 class Snake(Subscriber, Drawable, Actionable):
-    def __init__(self, game_field: GameField, game_world: GameWorld, info: Info):
-        self.direction = Direction.RIGHT
-        self.direction_lock = Lock()
-        self.direction_changed = Event()
+    # (dy, dx) head moves by in each direction
+    STEPS = {
+        DIR_RIGHT: (0, 1),
+        DIR_LEFT: (0, -1),
+        DIR_UP: (-1, 0),
+        DIR_DOWN: (1, 0),
+    }
+    OPPOSITE_DIRECTIONS = {
+        DIR_RIGHT: DIR_LEFT,
+        DIR_LEFT: DIR_RIGHT,
+        DIR_UP: DIR_DOWN,
+        DIR_DOWN: DIR_UP,
+    }
+    DIRECTION_NAMES = {
+        DIR_RIGHT: 'right',
+        DIR_LEFT: 'left',
+        DIR_UP: 'up',
+        DIR_DOWN: 'down',
+    }
+
+    def __init__(self, game_field: GameField, info: Info):
+        self.direction = DIR_RIGHT
+        self.direction_changed = False
         self.info = info
         self.game_field = game_field
-        self.game_world = game_world
+        # set once the mouse is placed, after the snake took its cell
+        self.mouse: Union[Mouse, None] = None
         free_cell = self.game_field.get_free_cell()
-        self.snake_elements = [SnakeElement(free_cell[0], free_cell[1])]
-        self.game_field.cells[free_cell[0]][free_cell[1]] = True
+        # (y, x) cells of the snake from head to tail. They are also occupied in game_field.cells,
+        # which is the only thing collisions are checked against, so a tick changes just two cells:
+        # the old tail cell is released and the new head cell is occupied
+        self.body = deque([free_cell])
+        self.game_field.occupy(free_cell[0], free_cell[1])
+        # cells taken by the head and left by the tail since the last draw,
+        # only they are drawn, as the window is not cleared between frames.
+        # The game world moves the snake before the first draw, so the starting cell is never drawn
+        self.new_cells = []
+        self.prev_tail = None
 
     @property
-    def head(self) -> SnakeElement:
-        return self.snake_elements[0]
+    def head(self) -> Tuple[int, int]:
+        return self.body[0]
 
     def event_received(self, event: object):
-        try:
-            self.change_direction(Direction(event))
-        except ValueError:
-            pass
+        # arrow key codes are directions themselves
+        if event in self.STEPS:
+            self.change_direction(event)
 
     def action(self):
         self.move()
-        if self.game_world.get_game_object(Mouse).intersect(self.head):
+        if self.mouse.intersect(self.head):
             self.grow()
             self.info.score += 1
-            self.game_world.remove_game_object(Mouse)
-            self.game_world.add(Mouse(*self.game_field.get_free_cell()))
-        self.direction_changed.clear()
-
-    def change_direction(self, new_direction: Direction):
-        # this method is called from input thread
-        # self.direction also used in game loop thread (action method),
-        # to prevent unexpected things - just lock it here
-        with self.direction_lock:
-            # this event is for those with fast hands, direction can be changed only once per game loop iteration
-            if not self.direction_changed.is_set():
-                if new_direction == Direction.RIGHT and self.direction not in {Direction.RIGHT, Direction.LEFT}:
-                    self.direction = Direction.RIGHT
-                elif new_direction == Direction.LEFT and self.direction not in {Direction.RIGHT, Direction.LEFT}:
-                    self.direction = Direction.LEFT
-                elif new_direction == Direction.UP and self.direction not in {Direction.UP, Direction.DOWN}:
-                    self.direction = Direction.UP
-                elif new_direction == Direction.DOWN and self.direction not in {Direction.UP, Direction.DOWN}:
-                    self.direction = Direction.DOWN
-                self.direction_changed.set()
+            self.mouse.move(*self.game_field.get_free_cell())
+        self.direction_changed = False
+
+    def change_direction(self, new_direction: int):
+        # this flag is for those with fast hands, direction can be changed only once per game loop iteration
+        if not self.direction_changed:
+            if new_direction != self.direction and new_direction != self.OPPOSITE_DIRECTIONS[self.direction]:
+                self.direction = new_direction
+            self.direction_changed = True
 
     def grow(self):
-        self.snake_elements.insert(0, SnakeElement(self.head.y, self.head.x))
         self._move_head()
 
     def move(self):
         self._move_tail()
         self._move_head()
+        # tail cell is released before moving the head, so the head can take it,
+        # but the tail is removed only now, as the new head is computed from the old one
+        self.body.pop()
 
     def draw(self, win):
-        for snake_element in self.snake_elements:
-            snake_element.draw(win)
+        # tail is erased first, the head may have taken its cell
+        addstr = win.addstr
+        prev_tail = self.prev_tail
+        if prev_tail is not None:
+            addstr(prev_tail[0], prev_tail[1], ' ')
+            self.prev_tail = None
+        bold = curses.A_BOLD
+        for y, x in self.new_cells:
+            addstr(y, x, 'X', bold)
+        self.new_cells.clear()
 
     def _move_head(self):
-        with self.direction_lock:
-            if self.direction == Direction.RIGHT:
-                self._move_right()
-            elif self.direction == Direction.LEFT:
-                self._move_left()
-            elif self.direction == Direction.UP:
-                self._move_up()
-            elif self.direction == Direction.DOWN:
-                self._move_down()
-            self.game_field.cells[self.head.y][self.head.x] = True
-
-    def _move_right(self):
-        if self.game_field.cells[self.head.y][self.head.x + 1]:
-            raise GameOver('bumped right')
-        self.head.x = self.head.x + 1
-
-    def _move_left(self):
-        if self.game_field.cells[self.head.y][self.head.x - 1]:
-            raise GameOver('bumped left')
-        self.head.x = self.head.x - 1
-
-    def _move_up(self):
-        if self.game_field.cells[self.head.y - 1][self.head.x]:
-            raise GameOver('bumped up')
-        self.head.y = self.head.y - 1
-
-    def _move_down(self):
-        if self.game_field.cells[self.head.y + 1][self.head.x]:
-            raise GameOver('bumped down')
-        self.head.y = self.head.y + 1
+        game_field = self.game_field
+        dy, dx = self.STEPS[self.direction]
+        y, x = self.body[0]
+        y, x = y + dy, x + dx
+        if game_field.cells[y * game_field.width + x]:
+            raise GameOver(f'bumped {self.DIRECTION_NAMES[self.direction]}')
+        self.body.appendleft((y, x))
+        self.new_cells.append((y, x))
+        game_field.occupy(y, x)
 
     def _move_tail(self):
-        prev_elem_x = self.snake_elements[0].x
-        prev_elem_y = self.snake_elements[0].y
-        for snake_element_idx in range(1, len(self.snake_elements)):
-            tmp_x = self.snake_elements[snake_element_idx].x
-            tmp_y = self.snake_elements[snake_element_idx].y
-            self.snake_elements[snake_element_idx].x = prev_elem_x
-            self.snake_elements[snake_element_idx].y = prev_elem_y
-            self.game_field.cells[prev_elem_y][prev_elem_x] = True
-            prev_elem_x, prev_elem_y = tmp_x, tmp_y
-        self.game_field.cells[prev_elem_y][prev_elem_x] = False
+        tail = self.body[-1]
+        self.game_field.release(tail[0], tail[1])
+        self.prev_tail = tail
 
 
 def main(stdscr):
@@ -319,16 +399,17 @@ def main(stdscr):
 
     stdscr.clear()
     win = curses.newwin(game_border_height + info_border_height + 1, game_border_width + 1, 0, 0)
-    win.nodelay(True)
     win.keypad(True)
 
-    game_world = GameWorld(stdscr, win)
+    game_world = GameWorld(win)
     game_field = GameField(game_border_width, game_border_height)
     info_border = Info(game_border_height, 0, info_border_height, game_border_width)
     game_world.add(info_border)
     game_world.add(Border(game_border_height, game_border_width, game_field))
-    game_world.add(Snake(game_field, game_world, info_border))
-    game_world.add(Mouse(*game_field.get_free_cell()))
+    snake = Snake(game_field, info_border)
+    game_world.add(snake)
+    snake.mouse = Mouse(*game_field.get_free_cell())
+    game_world.add(snake.mouse)
 
     game_world.run()
 